@@ -1,190 +1,771 @@
 # import libraries
+import argparse
+import os
+import types
 import numpy as np
 from scipy import optimize, constants
 import matplotlib.pyplot as plt
 import scipy.integrate as integrate
 import matplotlib.animation as animation
 from matplotlib.patches import Rectangle
-from math import pi, sin, cos, pow
-
-
-# system parameters
-g   = constants.g      # gravity
-L_p = 0.30              # pendulum length (m)
-L_a = 0.38             # arm length (m)
-m_p = 0.5              # pendulum mass (kg)
-m_a = 0.6              # arm mass
-I_a = 0.0025           # Moment of inertia of the arm
-I_p = 0.006            # Moment of inertia of the pendulum
-mc  = 0.15             # Location of the center of mass of the pendulum
+from math import pi, sin, cos
+from numba import njit, cfunc, carray
+from functools import lru_cache
+from dataclasses import dataclass, replace
 
 # simulation parameters
 dt = 0.05
 Tmax = 35
 t = np.arange(0.0, Tmax, dt)
-
-# initail condition
-theta = pi - 0.1      # pendulum initial angel
-dtheta = .0           # pendulum initial speed
-alpha = .0            # arm initial angle
-x0 = 0                # موقعیت هدف کالسکه
-dalpha= -0.05         # arm initial speed
-k = 0.4               # energy control gain
-
-# PID controller gains (Based on ACO, beta =1)
-Kp_theta = 4.091
-Kd_theta = 0.350
-Kp_alpha = 0.125
-Kd_alpha = 0.281
-
-# creating initial state
-state = np.array([theta, dtheta, alpha, dalpha])
-stabilizing = False
-
-# saving force control values
-u_values = []
+integrator = 'dopri5'  # 'dopri5' (adaptive), 'rk4' (fixed step), 'lsoda' (numbalsoda) or 'odeint' (scipy reference)
+
+
+# system parameters, initial condition and controller gains of one setup
+@dataclass(frozen=True)
+class RIPParams:
+    # system parameters
+    g: float = constants.g      # gravity
+    L_p: float = 0.30           # pendulum length (m)
+    L_a: float = 0.38           # arm length (m)
+    m_p: float = 0.5            # pendulum mass (kg)
+    m_a: float = 0.6            # arm mass
+    I_a: float = 0.0025         # Moment of inertia of the arm
+    I_p: float = 0.006          # Moment of inertia of the pendulum
+    mc: float = 0.15            # Location of the center of mass of the pendulum
+
+    # initail condition
+    theta: float = pi - 0.1     # pendulum initial angel
+    dtheta: float = .0          # pendulum initial speed
+    alpha: float = .0           # arm initial angle
+    x0: float = 0.0             # موقعیت هدف کالسکه
+    dalpha: float = -0.05       # arm initial speed
+    k: float = 0.4              # energy control gain
+
+    # PID controller gains (Based on ACO, beta =1)
+    Kp_theta: float = 4.091
+    Kd_theta: float = 0.350
+    Kp_alpha: float = 0.125
+    Kd_alpha: float = 0.281
+
+    @property
+    def gains(self):
+        return (self.Kp_theta, self.Kd_theta, self.Kp_alpha, self.Kd_alpha)
+
+    # initial state, the last entry is the stabilizing latch (0 = swing up)
+    @property
+    def state(self):
+        return np.array([self.theta, self.dtheta, self.alpha, self.dalpha, 0.0])
+
+    def with_gains(self, gains):
+        Kp_theta, Kd_theta, Kp_alpha, Kd_alpha = gains
+        return replace(self, Kp_theta=Kp_theta, Kd_theta=Kd_theta, Kp_alpha=Kp_alpha, Kd_alpha=Kd_alpha)
+
+    # packed parameters for the jitted right-hand side; all floats, since numba
+    # compiles a separate kernel for every int/float mix of the tuple
+    def packed(self):
+        return tuple(float(v) for v in (self.g, self.L_p, self.m_p, self.I_a, self.I_p, self.k, self.x0,
+                                        self.Kp_theta, self.Kd_theta, self.Kp_alpha, self.Kd_alpha,
+                                        1.0 / self.L_p))
+
+
+# 'aco': ACO-tuned gains on the physical arm (this script)
+# 'unit': unit-length point-mass pendulum with the gains of Controller/RIP.py
+PRESETS = {
+    'aco': RIPParams(),
+    'unit': RIPParams(g=9.8, L_p=1.0, L_a=1.0, I_a=0.0, I_p=0.0, mc=0.0, k=0.08,
+                      Kp_theta=50.0, Kd_theta=15.0, Kp_alpha=3.1, Kd_alpha=4.8),
+}
 
 # energy calculation
-def energy(th, dth): 
-    return 0.5 * (I_a * pow(alpha,2) + m_p * pow(m_p,2) + I_p * pow(dtheta,2)) + (m_p * g * L_p * (cos(theta) - 1))
+@njit(cache=True)
+def energy(th, dth, dal, params):
+    g, L_p, m_p, I_a, I_p = params[0], params[1], params[2], params[3], params[4]
+    return 0.5 * (I_a * dal * dal + m_p * L_p * L_p * dth * dth + I_p * dth * dth) + (m_p * g * L_p * (cos(th) - 1))
 
 # siwtch for control or swing up mode
-def isControllable(th, dth):
-    return th < pi/9 and abs(energy(th, dth)) < 0.5
+@njit(cache=True)
+def isControllable(th, dth, dal, params):
+    return th < pi/9 and abs(energy(th, dth, dal, params)) < 0.5
 
 
-def derivatives(state, t):
-    global stabilizing
-    ds = np.zeros_like(state) #?
+# latch value after a step: stays 1 once the controllable region is entered
+@njit(cache=True)
+def latch(state, params):
+    if state[4] or isControllable(state[0], state[1], state[3], params):
+        return 1.0
+    return 0.0
+
+
+# writes d(state)/dt into ds, every element is overwritten
+@njit(cache=True)
+def rhs_into(state, params, ds):
+    g, L_p, m_p, I_a, I_p, k, x0, Kp_theta, Kd_theta, Kp_alpha, Kd_alpha, INV_LP = params
     _theta  = state[0]  # pendulum angle
     _dtheta = state[1]  # pendulum velocity
     _alpha  = state[2]  # arm angle
     _dalpha = state[3]  # arm velovity
+    s = sin(_theta)
+    c = cos(_theta)
 
-    # control switch based on energy
-    if stabilizing or isControllable(_theta, _dtheta):
-        stabilizing = True
+    # control switch based on the latch
+    if state[4]:
         u = Kp_theta * _theta + Kd_theta * _dtheta + Kp_alpha * (_alpha - x0) + Kd_alpha * _dalpha #?
     else:
-        E = energy(_theta, _dtheta)
-        u = k * E * _dtheta * cos(_theta)
-
-    u_values.append(u)  
+        E = energy(_theta, _dtheta, _dalpha, params)
+        u = k * E * _dtheta * c
 
     ds[0] = state[1]
-    ds[1] = (g * sin(_theta) - u * cos(_theta)) / L_p
+    ds[1] = (g * s - u * c) * INV_LP
     ds[2] = state[3]
     ds[3] = u
-
-    return ds #?
-
-# simulation
-print("Integrating...")
-solution = integrate.odeint(derivatives, state, t)
-print("Done")
-
-# array size check for solution and u
-if len(u_values) > len(t):
-    u_values = u_values[:len(t)]
-elif len(u_values) < len(t):
-    t = t[:len(u_values)]
-
-# state variebles from ODE solution
-theta_s  = solution[:, 0]
-dtheta_s = solution[:, 1]
-alpha_s  = solution[:, 2]
-dalpha_s = solution[:, 3]
-
-
-plt.figure(figsize=(12, 12))
-
-# pendulum angle plot
-plt.subplot(3, 2, 1)
-plt.plot(t, theta_s, label="Angle (θ)")
-plt.xlabel("Time (s)")
-plt.ylabel("θ (rad)")
-plt.title("Pendulum Angle (θ) over Time")
-plt.grid()
-plt.legend()
-
-# pendulum velocity plot
-plt.subplot(3, 2, 2)
-plt.plot(t, dtheta_s, label="Angular Velocity (θ')", color='orange')
-plt.xlabel("Time (s)")
-plt.ylabel("θ' (rad/s)")
-plt.title("Angular Velocity (θ') over Time")
-plt.grid()
-plt.legend()
-
-# arm position plot
-plt.subplot(3, 2, 3)
-plt.plot(t, alpha_s, label="Cart Position (x)", color='green')
-plt.xlabel("Time (s)")
-plt.ylabel("x (m)")
-plt.title("Cart Position (x) over Time")
-plt.grid()
-plt.legend()
-
-# arm velocity 
-plt.subplot(3, 2, 4)
-plt.plot(t, dalpha_s, label="Cart Velocity (x')", color='red')
-plt.xlabel("Time (s)")
-plt.ylabel("x' (m/s)")
-plt.title("Cart Velocity (x') over Time")
-plt.legend()
-plt.grid()
-
-# control force plot
-plt.subplot(3, 2, 5)
-plt.plot(t, u_values, label="Control Force (u)", color='purple')
-plt.xlabel("Time (s)")
-plt.ylabel("u (N)")
-plt.title("Control Force (u) over Time")
-plt.legend()
-plt.grid()
-plt.tight_layout()
-plt.show()
-
-
-# پارامترهای شبیه‌سازی گرافیکی پاندول
-pxs = L_p * np.sin(theta_s) + alpha_s
-pys = L_p * np.cos(theta_s)
-
-fig = plt.figure()
-ax = fig.add_subplot(111, autoscale_on=False, xlim=(-1.5, 1.5), ylim=(-1.2, 1.2))
-ax.set_aspect('equal')
-ax.grid()
-
-patch = ax.add_patch(Rectangle((0, 0), 0, 0, linewidth=1, edgecolor='k', facecolor='g'))
-line, = ax.plot([], [], 'o-', lw=2)
-time_template = 'time = %.1fs'
-time_text = ax.text(0.05, 0.9, '', transform=ax.transAxes)
-
-energy_template = 'E = %.3f J'
-energy_text = ax.text(0.05, 0.85, '', transform=ax.transAxes)
-
-cart_width = 0.3
-cart_height = 0.2
-
-def init():
-    line.set_data([], [])
-    time_text.set_text('')
-    energy_text.set_text('')
-    patch.set_xy((-cart_width / 2, -cart_height / 2))
-    patch.set_width(cart_width)
-    patch.set_height(cart_height)
-    return line, time_text, energy_text, patch
-
-def animate(i):
-    thisx = [alpha_s[i], pxs[i]]
-    thisy = [0, pys[i]]
-    line.set_data(thisx, thisy)
-    time_text.set_text(time_template % (i * dt))
-    E = energy(theta_s[i], dtheta_s[i])
-    energy_text.set_text(energy_template % (E))
-    patch.set_x(alpha_s[i] - cart_width / 2)
-    return line, time_text, energy_text, patch
-
-ani = animation.FuncAnimation(fig, animate, np.arange(1, len(solution)), interval=25, blit=True, init_func=init)
-
-plt.show()
+    ds[4] = 0.0
+
+
+@njit(cache=True)
+def rhs(state, params):
+    ds = np.empty(5)
+    rhs_into(state, params, ds)
+    return ds
+
+
+# analytic Jacobian of rhs for the current control mode
+@njit(cache=True)
+def jacobian(state, params):
+    g, L_p, m_p, I_a, I_p, k, x0, Kp_theta, Kd_theta, Kp_alpha, Kd_alpha, INV_LP = params
+    J = np.zeros((5, 5))
+    _theta  = state[0]
+    _dtheta = state[1]
+    _dalpha = state[3]
+    s = sin(_theta)
+    c = cos(_theta)
+
+    # partial derivatives of u with respect to the state
+    if state[4]:
+        u = Kp_theta * _theta + Kd_theta * _dtheta + Kp_alpha * (state[2] - x0) + Kd_alpha * _dalpha
+        du0, du1, du2, du3 = Kp_theta, Kd_theta, Kp_alpha, Kd_alpha
+    else:
+        E = energy(_theta, _dtheta, _dalpha, params)
+        dE0 = -m_p * g * L_p * s
+        dE1 = (m_p * L_p * L_p + I_p) * _dtheta
+        dE3 = I_a * _dalpha
+        u = k * E * _dtheta * c
+        du0 = k * _dtheta * (dE0 * c - E * s)
+        du1 = k * c * (E + _dtheta * dE1)
+        du2 = 0.0
+        du3 = k * _dtheta * c * dE3
+
+    J[0, 1] = 1.0
+    J[1, 0] = (g * c + u * s - c * du0) * INV_LP
+    J[1, 1] = -c * du1 * INV_LP
+    J[1, 2] = -c * du2 * INV_LP
+    J[1, 3] = -c * du3 * INV_LP
+    J[2, 3] = 1.0
+    J[3, 0] = du0
+    J[3, 1] = du1
+    J[3, 2] = du2
+    J[3, 3] = du3
+    return J
+
+
+def Dfun(state, t, params):
+    return jacobian(state, params)
+
+
+# fixed-step classical RK4, the whole integration loop runs in compiled code;
+# the stages go through rhs_into into buffers allocated once per call
+@njit(cache=True)
+def simulate_rk4(state0, t_arr, params, n_sub=4):
+    n = t_arr.shape[0]
+    sol = np.empty((n, 5))
+    k1 = np.empty(5)
+    k2 = np.empty(5)
+    k3 = np.empty(5)
+    k4 = np.empty(5)
+    yt = np.empty(5)
+
+    y = state0.astype(np.float64)
+    y[4] = latch(y, params)
+    sol[0] = y
+    for i in range(1, n):
+        h = (t_arr[i] - t_arr[i - 1]) / n_sub
+        for _ in range(n_sub):
+            rhs_into(y, params, k1)
+            for m in range(5):
+                yt[m] = y[m] + 0.5 * h * k1[m]
+            rhs_into(yt, params, k2)
+            for m in range(5):
+                yt[m] = y[m] + 0.5 * h * k2[m]
+            rhs_into(yt, params, k3)
+            for m in range(5):
+                yt[m] = y[m] + h * k3[m]
+            rhs_into(yt, params, k4)
+            for m in range(5):
+                y[m] = y[m] + h / 6.0 * (k1[m] + 2.0 * k2[m] + 2.0 * k3[m] + k4[m])
+            y[4] = latch(y, params)
+        sol[i] = y
+    return sol
+
+
+# Dormand-Prince 5(4) tableau
+A21 = 1/5
+A31, A32 = 3/40, 9/40
+A41, A42, A43 = 44/45, -56/15, 32/9
+A51, A52, A53, A54 = 19372/6561, -25360/2187, 64448/6561, -212/729
+A61, A62, A63, A64, A65 = 9017/3168, -355/33, 46732/5247, 49/176, -5103/18656
+A71, A73, A74, A75, A76 = 35/384, 500/1113, 125/192, -2187/6784, 11/84
+# difference between the 5th and 4th order weights (local error estimate)
+E1, E3, E4, E5, E6, E7 = 71/57600, -71/16695, 71/1920, -17253/339200, 22/525, -1/40
+# continuous extension coefficients (Hairer, Norsett & Wanner)
+D1, D3, D4 = -12715105075/11282082432, 87487479700/32700410799, -10690763975/1880347072
+D5, D6, D7 = 701980252875/199316789632, -1453857185/822651844, 69997945/29380423
+
+
+@njit(cache=True)
+def _dense(rc1, rc2, rc3, rc4, rc5, s):
+    s1 = 1.0 - s
+    return rc1 + s * (rc2 + s1 * (rc3 + s * (rc4 + s1 * rc5)))
+
+
+@njit(cache=True)
+def _error_norm(err, y, y_new, rtol, atol):
+    acc = 0.0
+    for j in range(err.shape[0]):
+        sc = atol + rtol * max(abs(y[j]), abs(y_new[j]))
+        acc += (err[j] / sc) ** 2
+    return np.sqrt(acc / err.shape[0])
+
+
+# adaptive Dormand-Prince 5(4) with a PI step controller and dense output
+# onto t_arr. The latch is constant within a step and the switch to
+# stabilization is located by bisection on the dense output, after which
+# the integration restarts with the new vector field. Returns (sol, ok) with
+# ok False when max_steps ran out; the rows not reached are left NaN.
+@njit(cache=True)
+def simulate_dopri5(state0, t_arr, params, rtol=1e-6, atol=1e-8, max_steps=1000000):
+    n = t_arr.shape[0]
+    sol = np.full((n, 5), np.nan)
+    # stage, trial-state and dense-output buffers, reused on every step
+    k1 = np.empty(5)
+    k2 = np.empty(5)
+    k3 = np.empty(5)
+    k4 = np.empty(5)
+    k5 = np.empty(5)
+    k6 = np.empty(5)
+    k7 = np.empty(5)
+    yt = np.empty(5)
+    y_new = np.empty(5)
+    rc2 = np.empty(5)
+    rc3 = np.empty(5)
+    rc4 = np.empty(5)
+    rc5 = np.empty(5)
+
+    t0 = t_arr[0]
+    t_end = t_arr[n - 1]
+    y = state0.astype(np.float64)
+    y[4] = latch(y, params)
+    rhs_into(y, params, k1)
+    sol[0] = y
+
+    # initial step from the scaled state and slope
+    d0 = _error_norm(y, y, y, rtol, atol)
+    d1 = _error_norm(k1, y, y, rtol, atol)
+    h = 0.01 * d0 / d1 if d0 > 1e-5 and d1 > 1e-5 else 1e-6
+    h = min(h, t_end - t0)
+
+    beta = 0.04          # PI controller gain
+    v_prev = 1e-4
+    j = 1
+    t_cur = t0
+    steps = 0
+    while j < n and steps < max_steps:
+        steps += 1
+        h = min(h, t_end - t_cur)
+        for m in range(5):
+            yt[m] = y[m] + h * A21 * k1[m]
+        rhs_into(yt, params, k2)
+        for m in range(5):
+            yt[m] = y[m] + h * (A31 * k1[m] + A32 * k2[m])
+        rhs_into(yt, params, k3)
+        for m in range(5):
+            yt[m] = y[m] + h * (A41 * k1[m] + A42 * k2[m] + A43 * k3[m])
+        rhs_into(yt, params, k4)
+        for m in range(5):
+            yt[m] = y[m] + h * (A51 * k1[m] + A52 * k2[m] + A53 * k3[m] + A54 * k4[m])
+        rhs_into(yt, params, k5)
+        for m in range(5):
+            yt[m] = y[m] + h * (A61 * k1[m] + A62 * k2[m] + A63 * k3[m] + A64 * k4[m] + A65 * k5[m])
+        rhs_into(yt, params, k6)
+        for m in range(5):
+            y_new[m] = y[m] + h * (A71 * k1[m] + A73 * k3[m] + A74 * k4[m] + A75 * k5[m] + A76 * k6[m])
+        rhs_into(y_new, params, k7)
+
+        # local error estimate, written into yt
+        for m in range(5):
+            yt[m] = h * (E1 * k1[m] + E3 * k3[m] + E4 * k4[m] + E5 * k5[m] + E6 * k6[m] + E7 * k7[m])
+        v = _error_norm(yt, y, y_new, rtol, atol)
+        if v > 1.0 or not np.isfinite(v):
+            # reject and retry with a smaller step
+            h *= 0.2 if not np.isfinite(v) else max(0.2, 0.9 * v ** (-0.2))
+            continue
+
+        # dense output for the accepted step
+        for m in range(5):
+            rc2[m] = y_new[m] - y[m]
+            rc3[m] = h * k1[m] - rc2[m]
+            rc4[m] = rc2[m] - h * k7[m] - rc3[m]
+            rc5[m] = h * (D1 * k1[m] + D3 * k3[m] + D4 * k4[m] + D5 * k5[m] + D6 * k6[m] + D7 * k7[m])
+        t_new = t_cur + h
+
+        # event: first entry into the controllable region within the step
+        switched = False
+        if not y[4] and latch(y_new, params):
+            lo, hi = 0.0, 1.0
+            for _ in range(50):
+                mid = 0.5 * (lo + hi)
+                ym = _dense(y, rc2, rc3, rc4, rc5, mid)
+                if isControllable(ym[0], ym[1], ym[3], params):
+                    hi = mid
+                else:
+                    lo = mid
+            t_new = t_cur + hi * h
+            y_new[:] = _dense(y, rc2, rc3, rc4, rc5, hi)
+            y_new[4] = 1.0
+            switched = True
+
+        while j < n and t_arr[j] <= t_new:
+            sol[j] = _dense(y, rc2, rc3, rc4, rc5, (t_arr[j] - t_cur) / h)
+            j += 1
+
+        t_cur = t_new
+        y, y_new = y_new, y
+        if switched:
+            # restart on the stabilizing vector field
+            rhs_into(y, params, k1)
+        else:
+            k1, k7 = k7, k1
+
+        fac = 0.9 * max(v, 1e-10) ** (-0.2 + 0.75 * beta) * v_prev ** beta
+        h *= min(5.0, max(0.2, fac))
+        v_prev = max(v, 1e-4)
+    return sol, j == n
+
+# rhs_into specialized on one parameter set: the constants are closure
+# variables, which numba freezes into the compiled code, so products like g/L_p fold
+@lru_cache(maxsize=None)
+def make_rhs(params):
+    g, L_p, m_p, I_a, I_p, k, x0, Kp_theta, Kd_theta, Kp_alpha, Kd_alpha, INV_LP = params
+    G_OVER_LP = g * INV_LP
+    KE_A = 0.5 * I_a
+    KE_TH = 0.5 * (m_p * L_p * L_p + I_p)
+    PE = m_p * g * L_p
+
+    @njit
+    def rhs_into_specialized(state, params, ds):
+        _theta  = state[0]
+        _dtheta = state[1]
+        _alpha  = state[2]
+        _dalpha = state[3]
+        s = sin(_theta)
+        c = cos(_theta)
+
+        if state[4]:
+            u = Kp_theta * _theta + Kd_theta * _dtheta + Kp_alpha * (_alpha - x0) + Kd_alpha * _dalpha
+        else:
+            E = KE_A * _dalpha * _dalpha + KE_TH * _dtheta * _dtheta + PE * (c - 1)
+            u = k * E * _dtheta * c
+
+        ds[0] = _dtheta
+        ds[1] = G_OVER_LP * s - u * c * INV_LP
+        ds[2] = _dalpha
+        ds[3] = u
+        ds[4] = 0.0
+
+    return rhs_into_specialized
+
+
+# uncached rebuild of a kernel with its global rhs_into bound to make_rhs(params).
+# The cached kernels above keep calling the module-level rhs_into: taking it
+# as an argument would make it part of the signature, a new type in every
+# process, and the on-disk cache would recompile and grow on each run.
+@lru_cache(maxsize=None)
+def make_kernel(kernel, params):
+    py_func = kernel.py_func
+    scope = dict(py_func.__globals__, rhs_into=make_rhs(params))
+    return njit(types.FunctionType(py_func.__code__, scope, py_func.__name__, py_func.__defaults__))
+
+
+# numbalsoda kernel, built on first use since importing numbalsoda alone
+# takes seconds; returns (simulate_lsoda, address of the rhs cfunc)
+@lru_cache(maxsize=None)
+def _lsoda_kernel():
+    from numbalsoda import lsoda_sig, lsoda
+
+    # rhs behind the C ABI numbalsoda expects; p points at the packed params
+    @cfunc(lsoda_sig, cache=True)
+    def rhs_cfunc(t, u, du, p):
+        q = carray(p, (12,))
+        rhs_into(carray(u, (5,)), (q[0], q[1], q[2], q[3], q[4], q[5], q[6], q[7], q[8], q[9], q[10], q[11]),
+                 carray(du, (5,)))
+
+    # LSODA through t_arr with the switch located inside the sample interval as
+    # on the odeint path, all in compiled code; not disk-cached because
+    # numbalsoda's lsoda is a ctypes function pointer. Returns (sol, ok) with
+    # ok False once an lsoda call fails; the rows not reached are left NaN.
+    @njit
+    def simulate_lsoda(address, state0, t_arr, params, rtol=1.49e-8, atol=1.49e-8):
+        n = t_arr.shape[0]
+        sol = np.full((n, 5), np.nan)
+        data = np.array(params)
+        span = np.empty(2)
+
+        y = state0.astype(np.float64)
+        y[4] = latch(y, params)
+        sol[0] = y
+        for i in range(1, n):
+            usol, success = lsoda(address, y, t_arr[i - 1:i + 1], data, rtol, atol)
+            if not success:
+                return sol, False
+            y_new = usol[1].copy()
+            if not y[4] and latch(y_new, params):
+                span[0] = t_arr[i - 1]
+                lo, hi = t_arr[i - 1], t_arr[i]
+                for _ in range(40):
+                    span[1] = 0.5 * (lo + hi)
+                    usol, success = lsoda(address, y, span, data, rtol, atol)
+                    if not success:
+                        return sol, False
+                    if isControllable(usol[1, 0], usol[1, 1], usol[1, 3], params):
+                        hi = span[1]
+                    else:
+                        lo = span[1]
+                span[1] = hi
+                usol, success = lsoda(address, y, span, data, rtol, atol)
+                if not success:
+                    return sol, False
+                y_new = usol[1].copy()
+                y_new[4] = 1.0
+                span[0] = hi
+                span[1] = t_arr[i]
+                usol, success = lsoda(address, y_new, span, data, rtol, atol)
+                if not success:
+                    return sol, False
+                y_new = usol[1].copy()
+            y = y_new
+            y[4] = latch(y, params)
+            sol[i] = y
+        return sol, True
+
+    return simulate_lsoda, rhs_cfunc.address
+
+
+# optional Cython build of derivatives for the odeint reference path, compiled
+# on first use; the pyximport hook is removed again once rip_rhs is loaded
+@lru_cache(maxsize=None)
+def _cython_rhs():
+    try:
+        import pyximport
+    except ImportError:
+        return None
+    importers = pyximport.install(language_level=3)
+    try:
+        import rip_rhs
+    except ImportError:
+        rip_rhs = None
+    finally:
+        pyximport.uninstall(*importers)
+    return rip_rhs
+
+
+# integrate one trajectory with the selected integrator; ic may omit the latch.
+# specialize=True compiles the kernels against make_rhs(params), which pays off
+# when many initial conditions share one parameter set.
+def solve(ic, params, method=integrator, specialize=False):
+    state0 = np.zeros(5)
+    state0[:len(ic)] = ic
+    if method == 'dopri5':
+        kernel = make_kernel(simulate_dopri5, params) if specialize else simulate_dopri5
+        sol, ok = kernel(state0, t, params)
+        if not ok:
+            raise RuntimeError("dopri5 ran out of steps after t = %g" % t[np.isnan(sol[:, 0]).argmax() - 1])
+        return sol
+    if method == 'rk4':
+        if specialize:
+            return make_kernel(simulate_rk4, params)(state0, t, params)
+        return simulate_rk4(state0, t, params)
+    if method == 'lsoda':
+        try:
+            simulate_lsoda, address = _lsoda_kernel()
+        except ImportError:
+            raise ImportError("method='lsoda' needs numbalsoda") from None
+        sol, ok = simulate_lsoda(address, state0, t, params)
+        if not ok:
+            raise RuntimeError("lsoda failed after t = %g" % t[np.isnan(sol[:, 0]).argmax() - 1])
+        return sol
+    if method != 'odeint':
+        raise ValueError("unknown method %r, expected 'dopri5', 'rk4', 'lsoda' or 'odeint'" % (method,))
+
+    # reference path through scipy's LSODA, one call per output sample.
+    # Both RHS builds write into one scratch buffer per solve() call; odeint
+    # copies the returned array right away, so reusing it is safe.
+    out = np.empty(5)
+    rip_rhs = _cython_rhs()
+    if rip_rhs is not None:
+        p = np.asarray(params, dtype=np.float64)
+
+        def f(state, t, params):
+            rip_rhs.derivatives(state, t, p, out)
+            return out
+    else:
+        def f(state, t, params):
+            rhs_into(state, params, out)
+            return out
+
+    def step(y, t0, t1):
+        return integrate.odeint(f, y, [t0, t1], args=(params,), Dfun=Dfun, col_deriv=False)[-1]
+
+    sol = np.empty((len(t), 5))
+    y = state0
+    y[4] = latch(y, params)
+    sol[0] = y
+    for i in range(1, len(t)):
+        y_new = step(y, t[i - 1], t[i])
+        if not y[4] and latch(y_new, params):
+            # locate the switch inside the interval by bisection, re-integrating
+            # from t[i - 1], then finish the interval on the stabilizing field
+            lo, hi = t[i - 1], t[i]
+            for _ in range(40):
+                mid = 0.5 * (lo + hi)
+                ym = step(y, t[i - 1], mid)
+                if isControllable(ym[0], ym[1], ym[3], params):
+                    hi = mid
+                else:
+                    lo = mid
+            y_sw = step(y, t[i - 1], hi)
+            y_sw[4] = 1.0
+            y_new = step(y_sw, hi, t[i])
+        y = y_new
+        y[4] = latch(y, params)
+        sol[i] = y
+    return sol
+
+
+# trig, energy and control force along a trajectory (N, 5) or a stacked
+# batch of trajectories (..., N, 5) such as RIP_jax.solve_batch output,
+# evaluated in one pass per array; the latch column selects the control law
+def post_process(solution, params):
+    g, L_p, m_p, I_a, I_p, k, x0, Kp_theta, Kd_theta, Kp_alpha, Kd_alpha, INV_LP = params
+    theta_s, dtheta_s, alpha_s, dalpha_s, latch_s = np.moveaxis(solution, -1, 0)
+
+    sin_th = np.sin(theta_s)
+    cos_th = np.cos(theta_s)
+    E_arr = 0.5 * (I_a * dalpha_s**2 + m_p * L_p**2 * dtheta_s**2 + I_p * dtheta_s**2) + m_p * g * L_p * (cos_th - 1)
+
+    # control force on the solution grid, in the mode recorded by the latch
+    stab = latch_s > 0
+    u_ctrl = Kp_theta * theta_s + Kd_theta * dtheta_s + Kp_alpha * (alpha_s - x0) + Kd_alpha * dalpha_s
+    u_swing = k * E_arr * dtheta_s * cos_th
+    u_values = np.where(stab, u_ctrl, u_swing)
+    return sin_th, cos_th, E_arr, u_values
+
+
+# trajectory of one setup together with the derived arrays used for plotting
+@dataclass
+class Result:
+    setup: RIPParams
+    t: np.ndarray
+    solution: np.ndarray
+    sin_th: np.ndarray
+    cos_th: np.ndarray
+    E_arr: np.ndarray
+    u_values: np.ndarray
+
+    # state variebles from ODE solution, as contiguous 1-D arrays
+    def states(self):
+        return [np.ascontiguousarray(self.solution[:, i]) for i in range(5)]
+
+
+# simulate one setup from its own initial condition
+def simulate(setup=PRESETS['aco'], method=integrator, specialize=False):
+    p = setup.packed()
+    solution = solve(setup.state, p, method, specialize)
+    return Result(setup, t, solution, *post_process(solution, p))
+
+
+# simulate one initial condition / gain set on top of a setup
+def run(ic, gains, method=integrator, specialize=False, setup=PRESETS['aco']):
+    p = setup.with_gains(gains).packed()
+    solution = solve(ic, p, method, specialize)
+    return solution, post_process(solution, p)[3]
+
+
+# run (ic, gains) cases in parallel across CPU cores
+def run_ensemble(cases, n_jobs=-1, method=integrator, setup=PRESETS['aco']):
+    from joblib import Parallel, delayed
+    return Parallel(n_jobs=n_jobs, backend='loky')(delayed(run)(ic, gs, method, False, setup) for ic, gs in cases)
+
+
+# time histories of the states and the control force
+def plot_result(result, title):
+    theta_s, dtheta_s, alpha_s, dalpha_s, latch_s = result.states()
+    t = result.t
+
+    fig = plt.figure(figsize=(12, 12))
+    fig.suptitle(title)
+
+    # pendulum angle plot
+    plt.subplot(3, 2, 1)
+    plt.plot(t, theta_s, label="Angle (θ)")
+    plt.xlabel("Time (s)")
+    plt.ylabel("θ (rad)")
+    plt.title("Pendulum Angle (θ) over Time")
+    plt.grid()
+    plt.legend()
+
+    # pendulum velocity plot
+    plt.subplot(3, 2, 2)
+    plt.plot(t, dtheta_s, label="Angular Velocity (θ')", color='orange')
+    plt.xlabel("Time (s)")
+    plt.ylabel("θ' (rad/s)")
+    plt.title("Angular Velocity (θ') over Time")
+    plt.grid()
+    plt.legend()
+
+    # arm position plot
+    plt.subplot(3, 2, 3)
+    plt.plot(t, alpha_s, label="Cart Position (x)", color='green')
+    plt.xlabel("Time (s)")
+    plt.ylabel("x (m)")
+    plt.title("Cart Position (x) over Time")
+    plt.grid()
+    plt.legend()
+
+    # arm velocity
+    plt.subplot(3, 2, 4)
+    plt.plot(t, dalpha_s, label="Cart Velocity (x')", color='red')
+    plt.xlabel("Time (s)")
+    plt.ylabel("x' (m/s)")
+    plt.title("Cart Velocity (x') over Time")
+    plt.legend()
+    plt.grid()
+
+    # control force plot
+    plt.subplot(3, 2, 5)
+    plt.plot(t, result.u_values, label="Control Force (u)", color='purple')
+    plt.xlabel("Time (s)")
+    plt.ylabel("u (N)")
+    plt.title("Control Force (u) over Time")
+    plt.legend()
+    plt.grid()
+    plt.tight_layout()
+    return fig
+
+
+# pendulum animation, played back in real time; returns (fig, ani, interval_ms)
+def animate_result(result, title, interval_ms=25):
+    theta_s, dtheta_s, alpha_s, dalpha_s, latch_s = result.states()
+    L_p = result.setup.L_p
+    n = len(result.solution)
+
+    # پارامترهای شبیه‌سازی گرافیکی پاندول
+    pxs = L_p * result.sin_th + alpha_s
+    pys = L_p * result.cos_th
+
+    fig = plt.figure()
+    ax = fig.add_subplot(111, autoscale_on=False, xlim=(-1.5, 1.5), ylim=(-1.2, 1.2))
+    ax.set_aspect('equal')
+    ax.set_title(title)
+    ax.grid()
+
+    patch = ax.add_patch(Rectangle((0, 0), 0, 0, linewidth=1, edgecolor='k', facecolor='g'))
+    line, = ax.plot([], [], 'o-', lw=2)
+    time_template = 'time = %.1fs'
+    time_text = ax.text(0.05, 0.9, '', transform=ax.transAxes)
+
+    energy_template = 'E = %.3f J'
+    energy_text = ax.text(0.05, 0.85, '', transform=ax.transAxes)
+
+    cart_width = 0.3
+    cart_height = 0.2
+    x_left = alpha_s - cart_width / 2
+
+    # per-frame line coordinates and labels, prepared before the animation starts
+    xs_line = np.stack([alpha_s, pxs], axis=1)
+    ys_line = np.stack([np.zeros_like(pys), pys], axis=1)
+    time_labels = [time_template % ti for ti in result.t]
+    energy_labels = [energy_template % E for E in result.E_arr]
+
+    def init():
+        line.set_data([], [])
+        time_text.set_text('')
+        energy_text.set_text('')
+        patch.set_xy((-cart_width / 2, -cart_height / 2))
+        patch.set_width(cart_width)
+        patch.set_height(cart_height)
+        return line, time_text, energy_text, patch
+
+    def animate(i):
+        line.set_data(xs_line[i], ys_line[i])
+        time_text.set_text(time_labels[i])
+        energy_text.set_text(energy_labels[i])
+        patch.set_x(x_left[i])
+        return line, time_text, energy_text, patch
+
+    # play back in real time: draw every stride-th sample, one per interval
+    sample_dt = result.t[1] - result.t[0]
+    stride = max(1, int(round((interval_ms / 1000) / sample_dt)))
+    frames = np.arange(1, n, stride)
+    interval_ms = stride * sample_dt * 1000
+
+    ani = animation.FuncAnimation(fig, animate, frames, interval=interval_ms, blit=True, init_func=init,
+                                  cache_frame_data=False)
+    return fig, ani, interval_ms
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rotary inverted pendulum swing-up and stabilization")
+    parser.add_argument('--preset', choices=list(PRESETS) + ['all'], default='aco', help="setup(s) to simulate")
+    parser.add_argument('--interactive', action='store_true', help="show the plots and animation in a window")
+    parser.add_argument('--output', default='RIP.mp4', help="animation file written when not interactive")
+    args = parser.parse_args(argv)
+
+    # render straight to files without a GUI event loop unless asked for one
+    if not args.interactive:
+        plt.switch_backend('Agg')
+
+    names = list(PRESETS) if args.preset == 'all' else [args.preset]
+    stem, ext = os.path.splitext(args.output)
+    if not args.interactive and ext != '.gif' and not animation.FFMpegWriter.isAvailable():
+        print("ffmpeg not found, writing GIFs with Pillow instead (or run with --interactive)")
+        ext = '.gif'
+    animations = []
+    for name in names:
+        # simulation
+        print("Integrating %s..." % name)
+        result = simulate(PRESETS[name])
+        print("Done")
+
+        prefix = stem if len(names) == 1 else '%s_%s' % (stem, name)
+        fig = plot_result(result, name)
+        if not args.interactive:
+            fig.savefig(prefix + '_states.png', dpi=100)
+            plt.close(fig)
+
+        fig, ani, interval_ms = animate_result(result, name)
+        if args.interactive:
+            animations.append(ani)
+        else:
+            print("Rendering %s..." % (prefix + ext))
+            if ext == '.gif':
+                writer = animation.PillowWriter(fps=1000 / interval_ms)
+            else:
+                writer = animation.FFMpegWriter(fps=1000 / interval_ms, codec='h264', bitrate=1800)
+            ani.save(prefix + ext, writer=writer, dpi=100)
+            plt.close(fig)
+            print("Done")
+
+    if args.interactive:
+        plt.show()
+
+
+if __name__ == '__main__':
+    main()
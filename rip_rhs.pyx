@@ -0,0 +1,39 @@
+# cython: boundscheck=False, wraparound=False, cdivision=True, language_level=3
+# Cython build of the RIP.py right-hand side, used by the odeint reference path.
+# params layout: (g, L_p, m_p, I_a, I_p, k, x0, Kp_theta, Kd_theta, Kp_alpha, Kd_alpha, INV_LP)
+from libc.math cimport sin, cos, fabs, M_PI
+
+
+# energy calculation
+cdef inline double energy(double th, double dth, double dal, double[::1] p) noexcept nogil:
+    cdef double g = p[0], L_p = p[1], m_p = p[2], I_a = p[3], I_p = p[4]
+    return 0.5 * (I_a * dal * dal + m_p * L_p * L_p * dth * dth + I_p * dth * dth) + m_p * g * L_p * (cos(th) - 1)
+
+
+# siwtch for control or swing up mode
+cdef inline bint isControllable(double th, double dth, double dal, double[::1] p) noexcept nogil:
+    return th < M_PI / 9 and fabs(energy(th, dth, dal, p)) < 0.5
+
+
+# writes d(state)/dt into the preallocated out buffer
+cpdef void derivatives(double[::1] state, double t, double[::1] p, double[::1] out) noexcept nogil:
+    cdef double _theta  = state[0]  # pendulum angle
+    cdef double _dtheta = state[1]  # pendulum velocity
+    cdef double _alpha  = state[2]  # arm angle
+    cdef double _dalpha = state[3]  # arm velovity
+    cdef double s = sin(_theta)
+    cdef double c = cos(_theta)
+    cdef double u
+
+    # control switch based on the latch
+    if state[4] != 0.0:
+        u = p[7] * _theta + p[8] * _dtheta + p[9] * (_alpha - p[6]) + p[10] * _dalpha
+    else:
+        u = p[5] * energy(_theta, _dtheta, _dalpha, p) * _dtheta * c
+
+    out[0] = _dtheta
+    out[1] = (p[0] * s - u * c) * p[11]
+    out[2] = _dalpha
+    out[3] = u
+    out[4] = 0.0
+